@@ -1,7 +1,16 @@
-import requests
+import orjson
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argparse
 import time
-from datetime import datetime, timezone, timedelta
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import os
 from dotenv import load_dotenv
@@ -14,6 +23,10 @@ START_DATE = "2025-02-13"
 END_DATE = "2025-08-13" 
 SUBNETS = [64] # Add your subnets here
 OUTPUT_FILE = "bittensor_sn64_post.parquet"
+MAX_WORKERS = 8 # Concurrent (week, subnet) fetches
+RATE_LIMIT_PER_MIN = 40 # API request quota, shared by all workers
+CACHE_FILE = "taostats_cache.sqlite" # On-disk response cache, makes reruns ~instant
+CACHE_EXPIRE_SECONDS = 7 * 24 * 3600
 
 # API CONSTANTS
 BASE_URL = "https://api.taostats.io/api"
@@ -22,19 +35,106 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-def fetch_daily_prices(start_ts, end_ts):
+# OUTPUT SCHEMA (one row group is written per week)
+# hotkey is dictionary-encoded: the same ss58 strings repeat every week and load back as a category
+SCHEMA = pa.schema([
+    ('date', pa.string()),
+    ('block', pa.int32()),  # ~6M today, fits int32 for decades
+    ('netuid', pa.int16()),
+    ('uid', pa.int16()),    # UIDs are < 4096 per subnet
+    ('hotkey', pa.dictionary(pa.int32(), pa.string())),
+    ('stake_tao_value', pa.float64()),
+    ('emission_daily_tao', pa.float64()),
+    ('incentive', pa.float64()),
+    ('consensus', pa.float64()),
+    ('trust', pa.float64()),
+    ('alpha_price', pa.float64()),
+    ('active', pa.bool_()),
+])
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all workers. Requests go out immediately
+    while tokens are left and are delayed only once the per-minute quota is used up.
     """
-    Fetches prices for ALL subnets in the given window using dtao/pool/history.
-    Returns a dict: {netuid: price}
+    def __init__(self, rate_per_min):
+        self.capacity = float(rate_per_min)
+        self.rate = rate_per_min / 60.0
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.rate)
+                self.last = time.monotonic()
+                self.tokens = 0.0
+            else:
+                self.tokens -= 1
+
+RATE_LIMITER = TokenBucket(RATE_LIMIT_PER_MIN)
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that takes a token from the shared RATE_LIMITER before every
+    request that actually goes over the network.
+    """
+    def send(self, request, **kwargs):
+        RATE_LIMITER.acquire()
+        return super().send(request, **kwargs)
+
+class RateLimitedRetry(Retry):
+    """
+    Retry that also takes a token from RATE_LIMITER before every re-issued attempt,
+    since urllib3 retries inside HTTPAdapter.send and would otherwise bypass the bucket.
+    """
+    def sleep(self, response=None):
+        super().sleep(response)
+        RATE_LIMITER.acquire()
+
+# One pooled session for every call, so pagination reuses the same TLS connections.
+# The pool keeps one connection per worker alive, so concurrent requests never
+# fall back to a fresh handshake. 429s and transient 5xx are retried with backoff,
+# and every retry attempt goes through the rate limiter like the first one.
+# Successful responses are cached on disk, so a rerun of the same window skips HTTP
+# and, since only cache misses reach the adapter, the rate limiter as well.
+SESSION = requests_cache.CachedSession(
+    CACHE_FILE,
+    expire_after=CACHE_EXPIRE_SECONDS,
+    allowable_methods=('GET',),
+    cache_control=True,
+)
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", RateLimitedAdapter(
+    pool_connections=1,
+    pool_maxsize=MAX_WORKERS,
+    pool_block=True,
+    max_retries=RateLimitedRetry(
+        total=5,
+        backoff_factor=1.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,
+    ),
+))
+
+def fetch_daily_price(subnet_id, start_ts, end_ts):
+    """
+    Fetches the alpha price of one subnet in the given window using dtao/pool/history.
+    Returns the latest price, or None if the pool has no history in the window.
     """
     url = f"{BASE_URL}/dtao/pool/history/v1"
-    price_map = {}
+    price = None
     page = 1
     has_more = True
     
-    # We fetch all pools to ensure we get the subnets we need
+    # Filter on the subnet server-side instead of paging through every pool
     while has_more:
         params = {
+            "netuid": subnet_id,
             "timestamp_start": start_ts,
             "timestamp_end": end_ts,
             "limit": 256, # Max limit to reduce pages
@@ -42,44 +142,42 @@ def fetch_daily_prices(start_ts, end_ts):
         }
         
         try:
-            resp = requests.get(url, headers=HEADERS, params=params)
+            resp = SESSION.get(url, params=params, timeout=30)
             if resp.status_code != 200:
-                print(f"⚠️ Price fetch failed: {resp.status_code}")
+                print(f"⚠️ Price fetch failed for SN{subnet_id}: {resp.status_code}")
                 break
             
-            data = resp.json()
+            data = orjson.loads(resp.content)
             items = data.get('data', [])
             
             if not items: break
             
             for item in items:
-                netuid = item.get('netuid')
-                price = float(item.get('price', 0))
+                if item.get('netuid') != subnet_id:
+                    continue
                 
                 # Logic: We might get multiple price points for the same subnet in 24h.
                 # We overwrite to keep the LATEST one (closest to end of day).
                 # (Assuming the API returns chronological or we just take the last one seen)
-                price_map[netuid] = price
+                price = float(item.get('price', 0))
             
             # Pagination Check
             if data.get('pagination', {}).get('next_page'):
                 page += 1
-                time.sleep(1.5)
             else:
                 has_more = False
                 
         except Exception as e:
-            print(f"Error fetching prices: {e}")
+            print(f"Error fetching prices for SN{subnet_id}: {e}")
             break
             
-    return price_map
+    return price
 
 def fetch_miners_snapshot(subnet_id, start_ts, end_ts):
     """
     Fetches miner stats (emission, stake) with strict pagination.
     """
     url = f"{BASE_URL}/metagraph/history/v1"
-    all_miners = []
     page = 1
     has_more = True
     miner_dict = {} 
@@ -94,16 +192,13 @@ def fetch_miners_snapshot(subnet_id, start_ts, end_ts):
         }
         
         try:
-            resp = requests.get(url, headers=HEADERS, params=params)
+            resp = SESSION.get(url, params=params, timeout=30)
             
-            if resp.status_code == 429:
-                time.sleep(1)
-                continue
             if resp.status_code != 200:
                 print(f"❌ Error {resp.status_code} fetching miners for SN{subnet_id}")
                 break
             
-            data = resp.json()
+            data = orjson.loads(resp.content)
             items = data.get('data', [])
             
             if not items:
@@ -122,7 +217,6 @@ def fetch_miners_snapshot(subnet_id, start_ts, end_ts):
             # This ensures we loop through Page 1, 2, 3... until next_page is Null
             if data.get('pagination', {}).get('next_page'):
                 page += 1
-                time.sleep(1.5)
             else:
                 has_more = False
                 
@@ -132,86 +226,160 @@ def fetch_miners_snapshot(subnet_id, start_ts, end_ts):
             
     return list(miner_dict.values())
 
-def main():
+def build_table(miners, date_str, netuid, alpha_price):
+    """
+    Converts raw miner items of one (week, subnet) into an output table.
+    One pass over the items fills plain column lists (no per-miner record dicts),
+    then the TAO math runs once on whole arrays.
+    """
+    blocks, uids, hotkeys, actives = [], [], [], []
+    emission, stake, incentive, consensus, trust = [], [], [], [], []
+
+    for m in miners:
+        try:
+            e = float(m.get('emission', 0))
+            s = float(m.get('stake', 0))
+            # NEW: Grab incentive to prove "Intelligence" correlation
+            i = float(m.get('incentive', 0))
+            c = float(m.get('consensus', 0))
+            # Clean trust immediately
+            t = float(m.get('trust', 0) or 0.0)
+            hotkey = m.get('hotkey', {}).get('ss58')
+        except Exception:
+            continue # Null or unparseable values: skip the miner
+
+        emission.append(e)
+        stake.append(s)
+        incentive.append(i)
+        consensus.append(c)
+        trust.append(t)
+        hotkeys.append(hotkey)
+        blocks.append(m.get('block_number'))
+        uids.append(m.get('uid'))
+        actives.append(m.get('active'))
+
+    n = len(uids)
+    emission = np.array(emission)
+    stake = np.array(stake)
+
+    return pa.table({
+        'date': [date_str] * n,
+        'block': blocks,
+        'netuid': [netuid] * n,
+        'uid': uids,
+        # 'coldkey': ... (Keep if analyzing entity concentration, crucial for Gini!)
+        'hotkey': hotkeys,
+        'stake_tao_value': (stake / 1e9) * alpha_price,
+        'emission_daily_tao': (emission * 7200 / 1e9) * alpha_price,
+        'incentive': incentive,
+        'consensus': consensus,
+        'trust': trust,
+        'alpha_price': [alpha_price] * n,
+        'active': actives,
+    }, schema=SCHEMA)
+
+def main(profile=False):
     print("--- STARTING DTAO-AWARE DATA COLLECTION (V6) ---")
     
-    # Date Setup
-    current_date = datetime.strptime(START_DATE, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-    end_date_dt = datetime.strptime(END_DATE, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-    
-    all_records = []
-    total_weeks = int((end_date_dt - current_date).days / 7)
+    # Date Setup (the whole weekly schedule in one vectorized pass)
+    week_starts = pd.date_range(START_DATE, END_DATE, freq='7D', tz='UTC')
+    week_starts = week_starts[week_starts < pd.Timestamp(END_DATE, tz='UTC')]
+    ts_starts = (week_starts - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    weeks = list(zip(
+        week_starts.strftime("%Y-%m-%d"),
+        ts_starts.tolist(),
+        (ts_starts + 86400).tolist(), # 24h window
+    ))
+
+    # Written via a .part file, so a failed or interrupted run never replaces a complete dataset
+    part_file = f"{OUTPUT_FILE}.part"
+    writer = None
+    total_records = 0
+    # Wall time spent waiting on the API vs converting/writing (printed with --profile)
+    timings = defaultdict(float)
     
-    with tqdm(total=total_weeks, desc="Processing Weeks") as pbar:
-        
-        while current_date < end_date_dt:
-            date_str = current_date.strftime("%Y-%m-%d")
-            ts_start = int(current_date.timestamp())
-            ts_end = ts_start + 86400 # 24h window
-            
-            # 1. Fetch ALL Prices for this day first (Efficient)
-            # This saves us from making 60 separate calls inside the loop
-            daily_prices = fetch_daily_prices(ts_start, ts_end)
-            
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # 1. Fetch the Price and the Miners of every (week, subnet) concurrently,
+        # queued week by week so the first weeks are ready to write first
+        price_futures = {}
+        miner_futures = {}
+        for date_str, ts_start, ts_end in weeks:
             for netuid in SUBNETS:
-                # Get price from our lookup map, default to 1.0 (Pre-dTao)
-                # If dTao is active but price missing, it might mean the pool wasn't initialized yet
-                alpha_price = daily_prices.get(netuid, 1.0)
-                
-                # 2. Fetch Miners
-                miners = fetch_miners_snapshot(netuid, ts_start, ts_end)
-                
-                if miners:
-                    for m in miners:
-                        try:
-                            emission_raw = float(m.get('emission', 0))
-                            stake_raw = float(m.get('stake', 0))
-                            # NEW: Grab incentive to prove "Intelligence" correlation
-                            incentive = float(m.get('incentive', 0)) 
-                            consensus = float(m.get('consensus', 0))
-                            
-                            # Clean trust immediately
-                            trust = float(m.get('trust', 0) or 0.0)
-
-                            daily_emission_tao = (emission_raw * 7200 / 1e9) * alpha_price
-                            stake_tao_value = (stake_raw / 1e9) * alpha_price
-                            
-                            record = {
-                                'date': date_str,
-                                'block': m.get('block_number'),
-                                'netuid': netuid,
-                                'uid': m.get('uid'),
-                                # 'coldkey': ... (Keep if analyzing entity concentration, crucial for Gini!)
-                                'hotkey': m.get('hotkey', {}).get('ss58'),
-                                'stake_tao_value': stake_tao_value,
-                                'emission_daily_tao': daily_emission_tao,
-                                'incentive': incentive,    # <--- Added
-                                'consensus': consensus,    # <--- Added
-                                'trust': trust,           # <--- Fixed type
-                                'alpha_price': alpha_price, 
-                                'active': m.get('active'),
-                            }
-                            all_records.append(record)
-                        except Exception:
-                            continue
-
-                time.sleep(1.5) # Rate limit safety per subnet
-            
-            pbar.update(1)
-            pbar.set_postfix_str(f"Date: {date_str}")
-            current_date += timedelta(days=7)
-
-    # Save
-    if all_records:
-        df = pd.DataFrame(all_records)
-        df.to_parquet(OUTPUT_FILE, engine='fastparquet', compression='snappy')
-        print(f"\n✅ Success! Saved {len(df)} records.")
+                price_futures[(date_str, netuid)] = executor.submit(fetch_daily_price, netuid, ts_start, ts_end)
+                miner_futures[(date_str, netuid)] = executor.submit(fetch_miners_snapshot, netuid, ts_start, ts_end)
+
+        # 2. Consume weeks in order and stream each one to disk as a row group,
+        # while the pool keeps fetching ahead
+        try:
+            with tqdm(total=len(weeks), desc="Processing Weeks") as pbar:
+                for date_str, _, _ in weeks:
+                    week_tables = []
+
+                    for netuid in SUBNETS:
+                        t0 = time.perf_counter()
+                        miners = miner_futures.pop((date_str, netuid)).result()
+
+                        # Default to 1.0 (Pre-dTao) when there is no price
+                        # If dTao is active but price missing, it might mean the pool wasn't initialized yet
+                        alpha_price = price_futures.pop((date_str, netuid)).result()
+                        t1 = time.perf_counter()
+                        timings['fetch (waiting on API)'] += t1 - t0
+                        if alpha_price is None:
+                            alpha_price = 1.0
+                        if miners:
+                            week_tables.append(build_table(miners, date_str, netuid, alpha_price))
+                        timings['build_table'] += time.perf_counter() - t1
+
+                    t0 = time.perf_counter()
+                    table = pa.concat_tables(week_tables) if week_tables else None
+                    if table is not None and table.num_rows:
+                        if writer is None:
+                            writer = pq.ParquetWriter(
+                                part_file, SCHEMA,
+                                compression='zstd', compression_level=3, use_dictionary=True,
+                            )
+                        writer.write_table(table)
+                        total_records += table.num_rows
+                    timings['parquet write'] += time.perf_counter() - t0
+
+                    pbar.update(1)
+                    pbar.set_postfix_str(f"Date: {date_str}")
+        except BaseException:
+            # Drop the queued fetches so an error (or Ctrl-C) surfaces right away
+            # instead of after the rest of the schedule has been fetched
+            executor.shutdown(wait=False, cancel_futures=True)
+            # The partial output is discarded; the previous OUTPUT_FILE stays untouched
+            if writer is not None:
+                writer.close()
+                os.remove(part_file)
+            raise
+
+    if writer is not None:
+        writer.close()
+        os.replace(part_file, OUTPUT_FILE)
+
+    # Summary
+    if total_records:
+        print(f"\n✅ Success! Saved {total_records} records.")
         
-        # Validation Print
+        # Validation Print (only the last week's row group is read back)
         print("\n--- Data Sample ---")
-        print(df[['date', 'netuid', 'alpha_price', 'emission_daily_tao']].tail())
+        parquet_file = pq.ParquetFile(OUTPUT_FILE)
+        sample = parquet_file.read_row_group(
+            parquet_file.num_row_groups - 1,
+            columns=['date', 'netuid', 'alpha_price', 'emission_daily_tao'],
+        )
+        print(sample.to_pandas().tail())
     else:
         print("\n⚠️ No data collected.")
 
+    if profile:
+        print("\n--- Timings ---")
+        for section, seconds in sorted(timings.items(), key=lambda x: -x[1]):
+            print(f"{section:<24} {seconds:8.2f}s")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Weekly dTAO-aware metagraph snapshots from taostats")
+    parser.add_argument("--profile", action="store_true", help="print time spent waiting on the API vs building/writing tables")
+    args = parser.parse_args()
+    main(profile=args.profile)
\ No newline at end of file
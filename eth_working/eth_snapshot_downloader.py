@@ -1,5 +1,6 @@
+import os
 import requests
-import json
+import orjson
 from pathlib import Path
 
 NODE_URL = "http://10.105.50.169:5052"
@@ -10,23 +11,29 @@ def fetch_rich_snapshot():
     # We query 'head' to get the latest state
     url = f"{NODE_URL}/eth/v1/beacon/states/head/validators"
     
+    # Stream the raw bytes straight to disk (via a .part file, so a failed
+    # download never replaces a good snapshot) instead of parsing and re-serializing
+    part_file = f"{OUTPUT_FILE}.part"
+    
     try:
         print("Downloading... (This handles ~200MB of data, please wait)")
-        with requests.Session() as s:
-            r = s.get(url, stream=True)
+        with requests.Session() as s, s.get(url, stream=True) as r:
             r.raise_for_status()
-            data = r.json()
-            
-        validators = data.get("data", [])
-        print(f"✅ Success! Downloaded {len(validators)} validators.")
+            with open(part_file, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
         
-        # Save raw
-        with open(OUTPUT_FILE, "w") as f:
-            json.dump(data, f)
+        # Validate the download before it replaces the previous snapshot
+        with open(part_file, "rb") as f:
+            validators = orjson.loads(f.read()).get("data", [])
+        os.replace(part_file, OUTPUT_FILE)
         print(f"Saved to {OUTPUT_FILE}")
+        print(f"✅ Success! Downloaded {len(validators)} validators.")
         
     except Exception as e:
         print(f"❌ Error: {e}")
+        if os.path.exists(part_file):
+            os.remove(part_file)
 
 if __name__ == "__main__":
     fetch_rich_snapshot()
\ No newline at end of file
@@ -1,68 +1,75 @@
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
 # --- CONFIGURATION ---
 INPUT_FILE = "eth_entity_history_part1.parquet"
 OUTPUT_FILE = "eth_gini_daily.csv"
+PLOT_FILE = "eth_gini_daily.png"
 
-def gini(array):
-    """Calculate the Gini coefficient of a numpy array."""
-    array = array.flatten()
-    if np.amin(array) < 0:
-        array -= np.amin(array)
-    array = array.astype(float) # Ensure float math
-    array += 0.0000001
-    array = np.sort(array)
-    index = np.arange(1, array.shape[0] + 1)
-    n = array.shape[0]
-    return ((np.sum((2 * index - n  - 1) * array)) / (n * np.sum(array)))
+def gini_by_group(values, starts, sizes):
+    """
+    Calculate the Gini coefficient of every group in one vectorized pass.
+    Groups are contiguous runs of `values` (sorted descending within each group)
+    beginning at `starts` with lengths `sizes`.
+    """
+    values = values.astype(float) # Ensure float math
+    rank = np.arange(values.shape[0]) - np.repeat(starts, sizes) # 0-based rank, largest first
+    total = np.add.reduceat(values, starts)
+    # With the ascending 1-based index i = n - rank,
+    # sum((2 * i - n - 1) * values) == (n - 1) * sum(values) - 2 * sum(rank * values),
+    # which needs a single weighted array instead of per-element n and weight temporaries
+    numerator = (sizes - 1) * total - 2 * np.add.reduceat(rank * values, starts)
+    # Weeks with nothing to distribute are perfectly equal (Gini 0)
+    return np.divide(numerator, sizes * total, out=np.zeros_like(total), where=total > 0)
 
-def main():
+def main(plot=False):
     print(f"--- PROCESSING ETHEREUM GINI ({INPUT_FILE}) ---")
     
-    # 1. Load Data
-    df = pd.read_parquet(INPUT_FILE)
+    # 1. Load Data (only the columns we need; entity_id is never decoded)
+    df = pd.read_parquet(INPUT_FILE, columns=['week', 'validator_count'])
     
     # 2. Calculate Gini per Week
-    gini_results = []
+    # Sort once so every week is a contiguous run of counts, largest first;
+    # the same order serves the Gini and the Nakamoto calculation, and all weeks
+    # are computed together instead of looping over groups
+    df = df.sort_values(['week', 'validator_count'], ascending=[True, False])
+    group_sizes = df.groupby('week').size()
+    sizes = group_sizes.to_numpy()
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
     
-    # Group by the 'week' timestamp
-    grouped = df.groupby('week')
+    print(f"Calculating Gini for {len(sizes)} weeks...")
     
-    print(f"Calculating Gini for {len(grouped)} weeks...")
+    # The 'shares' are simply the validator counts per entity
+    shares = df['validator_count'].to_numpy()
+    gini = gini_by_group(shares, starts, sizes)
     
-    for date_val, group in grouped:
-        # The 'shares' are simply the validator counts per entity
-        shares = group['validator_count'].values
-        
-        g = gini(shares)
-        
-        # We also track entity count (N) to show centralization vs participation
-        entity_count = len(shares)
-        total_validators = shares.sum()
-        
-        # Calculate 'Nakamoto Coefficient' proxy (Entity holding >33% or >51%)
-        # Optional but powerful for thesis
-        sorted_shares = np.sort(shares)[::-1] # Descending
-        cumsum = np.cumsum(sorted_shares) / total_validators
-        nakamoto_33 = np.searchsorted(cumsum, 0.33) + 1
-        
-        gini_results.append({
-            'date': date_val,
-            'gini': g,
-            'entity_count': entity_count,
-            'total_validators': total_validators,
-            'nakamoto_33': nakamoto_33
-        })
-        
-    df_gini = pd.DataFrame(gini_results)
+    # We also track entity count (N) to show centralization vs participation
+    entity_count = sizes
+    total_validators = np.add.reduceat(shares, starts)
+    
+    # Calculate 'Nakamoto Coefficient' proxy (Entity holding >33% or >51%)
+    # Optional but powerful for thesis
+    # Number of largest entities needed to reach 33% = entities whose running share is still below it, plus one
+    # One running sum over the whole column, reset at every week start
+    cumsum = np.cumsum(shares)
+    cumsum -= np.repeat(cumsum[starts] - shares[starts], sizes)
+    cumsum = cumsum / np.repeat(total_validators, sizes)
+    nakamoto_33 = np.add.reduceat((cumsum < 0.33).astype(np.int64), starts) + 1
+    
+    df_gini = pd.DataFrame({
+        'date': group_sizes.index,
+        'gini': gini,
+        'entity_count': entity_count,
+        'total_validators': total_validators,
+        'nakamoto_33': nakamoto_33
+    })
     
     # 3. Upsample to Daily (Forward Fill)
     # This aligns the Weekly data to your Daily Bittensor timeline
     df_gini = df_gini.set_index('date').resample('D').ffill().reset_index()
     
-    # 4. Save and Plot
+    # 4. Save
     df_gini.to_csv(OUTPUT_FILE, index=False)
     print(f"✅ Saved daily Gini stats to {OUTPUT_FILE}")
     
@@ -71,15 +78,24 @@ def main():
     print(df_gini[['date', 'gini', 'entity_count', 'nakamoto_33']].head())
     print(f"\nAverage Gini: {df_gini['gini'].mean():.4f}")
     
-    # 5. Quick Visualization
-    plt.figure(figsize=(10, 5))
-    plt.plot(df_gini['date'], df_gini['gini'], label='Ethereum Gini (Stake)', color='blue')
-    plt.title('Ethereum Staking Concentration (Entity Level)')
-    plt.ylabel('Gini Coefficient')
-    plt.ylim(0.0, 1.0) # Set limit to 0-1 for context
-    plt.grid(True)
-    plt.legend()
-    plt.show()
+    # 5. Quick Visualization (opt-in, matplotlib is only imported when plotting)
+    if plot:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        
+        plt.figure(figsize=(10, 5))
+        plt.plot(df_gini['date'], df_gini['gini'], label='Ethereum Gini (Stake)', color='blue')
+        plt.title('Ethereum Staking Concentration (Entity Level)')
+        plt.ylabel('Gini Coefficient')
+        plt.ylim(0.0, 1.0) # Set limit to 0-1 for context
+        plt.grid(True)
+        plt.legend()
+        plt.savefig(PLOT_FILE)
+        print(f"Saved plot to {PLOT_FILE}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ethereum staking Gini per week")
+    parser.add_argument("--plot", action="store_true", help=f"save the Gini plot to {PLOT_FILE}")
+    args = parser.parse_args()
+    main(plot=args.plot)
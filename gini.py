@@ -1,10 +1,17 @@
+import argparse
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 
+PLOT_FILE = "sn1_gini.png"
+
+parser = argparse.ArgumentParser(description="Gini coefficient of miner incentive shares per day")
+parser.add_argument("--plot", action="store_true", help=f"save the Gini / miner count plot to {PLOT_FILE}")
+args = parser.parse_args()
+
 # Load your CLEAN, NORMALIZED data
 # (Ensure you use the dataframe from the previous step)
-df = pd.read_parquet("bittensor_sn1_post.parquet") 
+# Only the columns used below are read (Parquet column projection)
+df = pd.read_parquet("bittensor_sn1_post.parquet", columns=['date', 'incentive'])
 
 # ---------------------------------------------------------
 # PRE-PROCESSING (Repeated from your validation success)
@@ -25,23 +32,27 @@ def gini(array):
     array = array.flatten()
     if np.amin(array) < 0:
         array -= np.amin(array) # Values cannot be negative
-    array += 0.0000001 # Values cannot be 0
+    total = np.sum(array)
+    if total <= 0:
+        return 0.0 # Nothing to distribute: perfectly equal
     array = np.sort(array)
     index = np.arange(1, array.shape[0] + 1)
     n = array.shape[0]
-    return ((np.sum((2 * index - n  - 1) * array)) / (n * np.sum(array)))
+    # sum((2 * index - n - 1) * array) as one dot product, without weight temporaries
+    return (2 * np.dot(index, array) - (n + 1) * total) / (n * total)
 
 # ---------------------------------------------------------
 # APPLY PER DAY
 # ---------------------------------------------------------
 gini_results = []
-dates = df['date'].unique()
+# One sort-based grouping pass instead of a full boolean scan of the frame per day
+by_date = df.groupby('date', sort=True)['share']
 
-print(f"Calculating Gini for {len(dates)} days...")
+print(f"Calculating Gini for {by_date.ngroups} days...")
 
-for d in sorted(dates):
+for d, day_group in by_date:
     # Get all miner shares for this specific day
-    day_shares = df[df['date'] == d]['share'].values
+    day_shares = day_group.values
     
     # Calculate Gini
     g = gini(day_shares)
@@ -54,28 +65,35 @@ for d in sorted(dates):
 df_gini = pd.DataFrame(gini_results)
 
 # ---------------------------------------------------------
-# PLOT
+# PLOT (--plot)
 # ---------------------------------------------------------
-plt.figure(figsize=(12, 6))
-
-# Plot Gini
-plt.subplot(2, 1, 1)
-plt.plot(pd.to_datetime(df_gini['date']), df_gini['gini'], color='purple', label='Gini Coefficient')
-plt.title('Subnet 1: Concentration of Intelligence (Gini) Over Time')
-plt.ylabel('Gini (0=Equal, 1=Centralized)')
-plt.grid(True)
-plt.legend()
-
-# Plot Miner Count (To see if low N explains high Gini)
-plt.subplot(2, 1, 2)
-plt.bar(pd.to_datetime(df_gini['date']), df_gini['miner_count'], color='orange', alpha=0.6, label='Active Miners (Incentive > 0)')
-plt.ylabel('Count')
-plt.xlabel('Date')
-plt.grid(True)
-plt.legend()
-
-plt.tight_layout()
-plt.show()
+# Opt-in: matplotlib is only imported (with the non-interactive Agg backend) when plotting
+if args.plot:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6))
+
+    # Plot Gini
+    plt.subplot(2, 1, 1)
+    plt.plot(pd.to_datetime(df_gini['date']), df_gini['gini'], color='purple', label='Gini Coefficient')
+    plt.title('Subnet 1: Concentration of Intelligence (Gini) Over Time')
+    plt.ylabel('Gini (0=Equal, 1=Centralized)')
+    plt.grid(True)
+    plt.legend()
+
+    # Plot Miner Count (To see if low N explains high Gini)
+    plt.subplot(2, 1, 2)
+    plt.bar(pd.to_datetime(df_gini['date']), df_gini['miner_count'], color='orange', alpha=0.6, label='Active Miners (Incentive > 0)')
+    plt.ylabel('Count')
+    plt.xlabel('Date')
+    plt.grid(True)
+    plt.legend()
+
+    plt.tight_layout()
+    plt.savefig(PLOT_FILE)
+    print(f"Saved plot to {PLOT_FILE}")
 
 # Print Averages
 print(f"Average Gini: {df_gini['gini'].mean():.4f}")
\ No newline at end of file